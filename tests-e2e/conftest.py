@@ -1,22 +1,56 @@
+import hashlib
+import json
+import logging
+import os
+import socket
 import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from contextlib import contextmanager
-from typing import Iterator
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, Optional
+import httpx
+import orjson
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 import pytest
-import requests
+import pytest_asyncio
 import time
-from tenacity import retry, stop_after_delay, wait_fixed
+from tenacity import retry, stop_after_delay, wait_exponential, wait_random
+
+from fixtures_data import GATEWAY_URL
 
 pytest_plugins = ["fixtures_data"]
 
+logger = logging.getLogger("e2e")
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-GATEWAY_URL = "http://localhost:8080"
-CONFIG_SERVER_URL = "http://localhost:8888"
 COMPOSE_FILE = "docker-compose.yml"
-EUREKA_URL = "http://localhost:8761"
+E2E_DIR = Path(__file__).resolve().parent
+REPO_ROOT = E2E_DIR.parent
+# Отпечаток исходников сервисов, с которыми был собран текущий стек
+FINGERPRINT_FILE = E2E_DIR / ".pytest_stack_fingerprint"
+
+# BuildKit нужен для inline-кэша слоёв (cache_from) и cache mount'ов в Dockerfile
+COMPOSE_ENV = {**os.environ, "DOCKER_BUILDKIT": "1", "COMPOSE_DOCKER_CLI_BUILD": "1"}
+
+# Сервисы, которые собираются из исходников (имя каталога == имя в compose)
+BUILT_SERVICES = [
+    "config-server",
+    "eureka-server",
+    "gateway-service",
+    "user-service",
+    "product-service",
+    "order-service",
+    "moderation-service",
+]
+
+# Базы данных, для которых `make bake-postgres` собирает образы с применёнными миграциями
+BAKED_DATABASES = ["user", "product", "order", "moderation"]
 
 SERVICES = [
     ("Moderation Service", "moderation-service"),
@@ -32,16 +66,17 @@ DB_CONFIG = [
     ("db_moderation", "localhost", 5404, "itmomarket_moderation"),
 ]
 
-TRUNCATE_QUERIES = [
-    "TRUNCATE TABLE order_items CASCADE;",
-    "TRUNCATE TABLE orders CASCADE;",
-    "TRUNCATE TABLE carts CASCADE;",
-    "TRUNCATE TABLE moderation_audit CASCADE;",
-    "TRUNCATE TABLE moderation_actions CASCADE;",
-    "TRUNCATE TABLE products CASCADE;",
-    "TRUNCATE TABLE shops CASCADE;",
-    "TRUNCATE TABLE user_roles CASCADE;",
-    "TRUNCATE TABLE users CASCADE;",
+# Таблицы, очищаемые перед каждым тестом (во всех БД, где они есть)
+TRUNCATE_TABLES = [
+    "order_items",
+    "orders",
+    "carts",
+    "moderation_audit",
+    "moderation_actions",
+    "products",
+    "shops",
+    "user_roles",
+    "users",
 ]
 
 
@@ -49,141 +84,372 @@ TRUNCATE_QUERIES = [
 # HELPER FUNCTIONS
 # ============================================================================
 
-def _print_header(title: str) -> None:
-    """Print formatted header."""
-    print("\n" + "="*70)
-    print(title)
-    print("="*70)
+# Результат проверки готовности сервисов (один раз на процесс)
+_READY = False
+_READY_LOCK = threading.Lock()
 
+# Один поток на БД: у каждого потока своё соединение, общего состояния нет
+_cleanup_executor = ThreadPoolExecutor(max_workers=len(DB_CONFIG), thread_name_prefix="db-cleanup")
 
-def _print_success(message: str) -> None:
-    """Print success message."""
-    print(f"[✓] {message}")
 
+def _configure_logging(config) -> None:
+    """Attach one stderr handler to the e2e logger; progress lines are shown only with -v."""
+    if logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO if config.option.verbose > 0 else logging.WARNING)
+    logger.propagate = False
 
-def _print_error(message: str) -> None:
-    """Print error message."""
-    print(f"[✗] {message}")
 
+def _log_header(title: str) -> None:
+    """Log formatted header."""
+    logger.info("\n%s\n%s\n%s", "=" * 70, title, "=" * 70)
 
-def _print_step(step: int, total: int, message: str) -> None:
-    """Print step progress."""
-    print(f"\n[{step}/{total}] {message}...")
 
+def _log_success(message: str) -> None:
+    """Log success message."""
+    logger.info("[✓] %s", message)
+
+
+def _log_error(message: str) -> None:
+    """Log error message."""
+    logger.error("[✗] %s", message)
+
+
+def _compose(*args: str) -> subprocess.CompletedProcess:
+    """Run a docker-compose subcommand against COMPOSE_FILE and capture its output."""
+    return subprocess.run(
+        ["docker-compose", "-f", COMPOSE_FILE, *args],
+        check=False,
+        capture_output=True,
+        text=True,
+        env=COMPOSE_ENV,
+    )
+
+
+def _stack_is_healthy() -> bool:
+    """True when every compose service already has a running (and healthy, if checked) container."""
+    services = _compose("config", "--services").stdout.split()
+    container_ids = _compose("ps", "-q").stdout.split()
+    if not services or len(container_ids) < len(services):
+        return False
+
+    states = subprocess.run(
+        ["docker", "inspect", "--format",
+         "{{if .State.Health}}{{.State.Health.Status}}{{else}}{{.State.Status}}{{end}}",
+         *container_ids],
+        check=False,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return len(states) == len(container_ids) and all(
+        state in ("healthy", "running") for state in states
+    )
+
+
+def _use_baked_postgres() -> None:
+    """Point compose at the preseeded postgres images from `make bake-postgres` when they exist locally."""
+    for db in BAKED_DATABASES:
+        image = f"itmomarket/postgres-{db}-preseeded:latest"
+        inspect = subprocess.run(["docker", "image", "inspect", image], check=False, capture_output=True)
+        if inspect.returncode == 0:
+            COMPOSE_ENV[f"E2E_POSTGRES_{db.upper()}_IMAGE"] = image
+
+
+def _git(*args: str) -> str:
+    """Run a git command in the repository root and return its stdout."""
+    return subprocess.run(
+        ["git", "-C", str(REPO_ROOT), *args],
+        check=False,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def _compose_fingerprint() -> str:
+    """Hash the compose file and the postgres images it will run (tag and image id, so re-baking counts)."""
+    state = [(E2E_DIR / COMPOSE_FILE).read_text()]
+    for db in BAKED_DATABASES:
+        image = COMPOSE_ENV.get(f"E2E_POSTGRES_{db.upper()}_IMAGE", "postgres:15-alpine")
+        image_id = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}", image],
+            check=False,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        state.append(f"{db}={image}@{image_id}")
+    return hashlib.sha256("\n".join(state).encode()).hexdigest()
+
+
+def _stack_fingerprint() -> Dict[str, str]:
+    """
+    Hash each service's sources (committed tree plus uncommitted and untracked changes)
+    and, under the "compose" key, the stack definition itself.
+    """
+    fingerprint = {"compose": _compose_fingerprint()}
+    for service in BUILT_SERVICES:
+        state = "\n".join([
+            _git("rev-parse", f"HEAD:{service}"),
+            _git("diff", "HEAD", "--", service),
+            _git("ls-files", "--others", "--exclude-standard", "--", service),
+        ])
+        fingerprint[service] = hashlib.sha256(state.encode()).hexdigest()
+    return fingerprint
+
+
+def _load_fingerprint() -> Dict[str, str]:
+    """Fingerprint saved by the previous run, or {} on the first run."""
+    try:
+        return json.loads(FINGERPRINT_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _truncate_sql(conn) -> Optional[str]:
+    """Build the cleanup statement for the TRUNCATE_TABLES that exist in this database."""
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public';")
+        present = {row[0] for row in cur.fetchall()}
+
+    existing = [table for table in TRUNCATE_TABLES if table in present]
+    if not existing:
+        return None
+    # replica role skips FK/RI triggers; SET LOCAL resets it on commit or rollback
+    return (
+        "SET LOCAL session_replication_role = replica; "
+        f"TRUNCATE TABLE {', '.join(existing)} RESTART IDENTITY CASCADE;"
+    )
+
+
+def _truncate(conn, sql: str) -> None:
+    """Run a cached TRUNCATE statement in its own transaction."""
+    with conn, conn.cursor() as cur:
+        cur.execute(sql)
 
-@retry(stop=stop_after_delay(900), wait=wait_fixed(5))
-def _check_config_server() -> None:
-    """Wait for config-server to become healthy."""
-    
-    resp = requests.get(f"{CONFIG_SERVER_URL}/user-service/default", timeout=10)
-    resp.raise_for_status()
 
+def _truncate_all_databases() -> None:
+    """Truncate every test database once, before xdist workers start."""
+    for _, host, port, db in DB_CONFIG:
+        with pg_connection(host, port, db) as conn:
+            sql = _truncate_sql(conn)
+            if sql is not None:
+                _truncate(conn, sql)
 
-@retry(stop=stop_after_delay(500), wait=wait_fixed(5))
-def _check_gateway() -> None:
-    """Check if API Gateway is healthy."""
-    resp = requests.get(f"{GATEWAY_URL}/actuator/health", timeout=10)
-    resp.raise_for_status()
 
+def _is_xdist_worker() -> bool:
+    """True inside a pytest-xdist worker process (the controller owns the stack)."""
+    return os.environ.get("PYTEST_XDIST_WORKER") is not None
 
-@retry(stop=stop_after_delay(500), wait=wait_fixed(5))
-def _check_eureka() -> None:
-    """Check if Eureka service discovery is healthy."""
-    resp = requests.get(f"{EUREKA_URL}/", timeout=10)
-    resp.raise_for_status()
 
+class _OrjsonBodies:
+    """httpx client mixin that encodes `json=` bodies with orjson instead of the stdlib json module."""
 
-@retry(stop=stop_after_delay(500), wait=wait_fixed(5))
-def _check_service(service_name: str, service_id: str) -> None:
-    """Check if a microservice is healthy via Gateway."""
-    url = f"{GATEWAY_URL}/{service_id}/actuator/health/readiness"
+    def build_request(self, method, url, *, json=None, headers=None, **kwargs):
+        if json is not None:
+            kwargs["content"] = orjson.dumps(json)
+            headers = {**(headers or {}), "Content-Type": "application/json"}
+        return super().build_request(method, url, headers=headers, **kwargs)
+
+
+class _OrjsonClient(_OrjsonBodies, httpx.Client):
+    pass
+
+
+class _OrjsonAsyncClient(_OrjsonBodies, httpx.AsyncClient):
+    pass
+
+
+# Общие настройки клиентов: все запросы идут на один хост (gateway), поэтому
+# HTTP/2 мультиплексирует потоки поверх немногих keep-alive соединений
+# (при TLS; по открытому http httpx остаётся на HTTP/1.1 с тем же пулом)
+_HTTP_CLIENT_OPTIONS = dict(base_url=GATEWAY_URL, timeout=30)
+
+# Тела запросов маленькие (сотни байт): без TCP_NODELAY алгоритм Нейгла может
+# придержать сегмент до ACK; SO_KEEPALIVE не даёт простаивающим сокетам пула умереть молча
+_SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+
+def _http_session() -> httpx.Client:
+    """Sync httpx client with a keep-alive connection pool (one TCP handshake per socket, not per call)."""
+    transport = httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=16, max_connections=64),
+        socket_options=_SOCKET_OPTIONS,
+    )
+    return _OrjsonClient(**_HTTP_CLIENT_OPTIONS, transport=transport)
+
+
+@retry(stop=stop_after_delay(500), wait=wait_exponential(multiplier=0.2, min=0.2, max=2) + wait_random(0, 0.2))
+def _check_service(http: httpx.Client, service_name: str, service_id: str) -> None:
+    """
+    Check if a microservice is reachable via Gateway.
+    Container health is already awaited by `up --wait`; this only waits for Eureka registration.
+    """
+    url = f"/{service_id}/actuator/health/readiness"
     
     try:
-        resp = requests.get(url, timeout=10)
+        resp = http.get(url, timeout=10)
         
         if resp.status_code == 503:
-            print(f"[...] {service_name}: Waiting for registration...")
+            logger.debug("[...] %s: Waiting for registration...", service_name)
             raise Exception(f"{service_name} unavailable (503)")
         
         if resp.status_code != 200:
             raise Exception(f"{service_name} returned {resp.status_code}")
         
-        health_data = resp.json()
+        health_data = orjson.loads(resp.content)
         status = health_data.get("status", "UNKNOWN")
-        _print_success(f"{service_name} is UP (status: {status})")
+        _log_success(f"{service_name} is UP (status: {status})")
         
-    except requests.RequestException as e:
-        print(f"[...] {service_name}: {type(e).__name__}")
+    except httpx.HTTPError as e:
+        logger.debug("[...] %s: %s", service_name, type(e).__name__)
         raise
 
 
+def _probe_infrastructure() -> None:
+    """
+    Wait until every microservice is routable through the gateway.
+    Memoized per process: only the first call probes, later ones return at once.
+    """
+    global _READY
+    with _READY_LOCK:
+        if _READY:
+            return
+
+        # Config Server, Eureka и Gateway уже healthy (docker-compose up --wait),
+        # осталось дождаться регистрации микросервисов в Eureka — все параллельно
+        logger.info("Waiting for %s...", ", ".join(name for name, _ in SERVICES))
+        with _http_session() as http, ThreadPoolExecutor(max_workers=len(SERVICES)) as executor:
+            futures = [
+                executor.submit(_check_service, http, service_name, service_id)
+                for service_name, service_id in SERVICES
+            ]
+            for future in as_completed(futures, timeout=600):
+                future.result()
+        _READY = True
+
+
 # ============================================================================
 # PYTEST HOOKS
 # ============================================================================
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--keep-stack",
+        action="store_true",
+        default=os.environ.get("KEEP_STACK") == "1",
+        help="leave the docker-compose stack running after the session (also KEEP_STACK=1)",
+    )
+
+
 def pytest_configure(config):
     """
     Pre-test setup hook.
     Runs BEFORE test collection.
     Starts Docker infrastructure and waits for all services.
+    Under pytest-xdist only the controller runs it; workers reuse the stack.
     """
-    
-    _print_header("PRE-TEST SETUP: Starting infrastructure")
-    
-    # Stop any existing containers
-    print("Stopping old containers...")
-    subprocess.run(
-        ["docker-compose", "-f", COMPOSE_FILE, "down", "-v"],
-        check=False,
-        capture_output=True,
-    )
-    
-    # Start new containers
-    print("Starting docker-compose with --build...")
-    result = subprocess.run(
-        ["docker-compose", "-f", COMPOSE_FILE, "up", "-d", "--build"]
-    )
-    
-    _print_success("Docker-compose started")
+    if _is_xdist_worker():
+        return
+
+    _configure_logging(config)
+
+    # Воркеры xdist наследуют окружение контроллера и берут адрес шлюза отсюда
+    os.environ["E2E_GATEWAY_URL"] = GATEWAY_URL
+
+    _log_header("PRE-TEST SETUP: Starting infrastructure")
+
+    _use_baked_postgres()
+
+    fingerprint = _stack_fingerprint()
+    previous = _load_fingerprint()
+    changed = [service for service in BUILT_SERVICES if previous.get(service) != fingerprint[service]]
+
+    # Изменения docker-compose.yml или выбранных образов postgres затрагивают весь стек
+    compose_changed = previous.get("compose") != fingerprint["compose"]
+
+    if previous and not compose_changed and _stack_is_healthy():
+        # Стек уже поднят и здоров — пересобираем только изменившиеся сервисы
+        if changed:
+            logger.info("Rebuilding changed services: %s...", ", ".join(changed))
+            result = subprocess.run(
+                ["docker-compose", "-f", COMPOSE_FILE, "up", "-d", "--build",
+                 "--wait", "--wait-timeout", "600", *changed],
+                env=COMPOSE_ENV,
+            )
+            if result.returncode != 0:
+                # Старые контейнеры продолжают работать — не записываем отпечаток,
+                # чтобы следующий запуск снова попробовал пересобрать
+                _log_error(f"Rebuilding {', '.join(changed)} failed (exit code {result.returncode})")
+                raise SystemExit(1)
+            _log_success("Changed services rebuilt")
+        else:
+            _log_success("Docker-compose stack is up to date, reusing it")
+    else:
+        # Stop any existing containers
+        logger.info("Stopping old containers...")
+        _compose("down", "-v")
+
+        # Start new containers
+        logger.info("Starting docker-compose with --build...")
+        result = subprocess.run(
+            ["docker-compose", "-f", COMPOSE_FILE, "up", "-d", "--build",
+             "--wait", "--wait-timeout", "600"],
+            env=COMPOSE_ENV,
+        )
+        if result.returncode != 0:
+            _log_error(f"docker-compose up failed (exit code {result.returncode})")
+            raise SystemExit(1)
+
+        _log_success("Docker-compose started")
     
     # Wait for infrastructure
-    _print_header("WAITING FOR SERVICES TO BE READY")
+    _log_header("WAITING FOR SERVICES TO BE READY")
     
     try:
-        _print_step(0, 6, "Waiting for Config Server")
-        _check_config_server()
+        _probe_infrastructure()
 
-        _print_step(1, 6, "Waiting for Service Registry (Eureka)")
-        _check_eureka()
+        _log_header("[✓] ALL INFRASTRUCTURE READY!")
+        FINGERPRINT_FILE.write_text(json.dumps(fingerprint))
 
-        _print_step(2, 6, "Waiting for API Gateway")
-        _check_gateway()
-        
-        # Wait for each microservice
-        for idx, (service_name, service_id) in enumerate(SERVICES, start=3):
-            _print_step(idx, 6, f"Waiting for {service_name}")
-            _check_service(service_name, service_id)
-        
-        _print_header("[✓] ALL INFRASTRUCTURE READY!")
-        print()
+        # Workers share the databases, so they cannot truncate per test:
+        # clean once here, before any worker starts.
+        if config.getoption("numprocesses", default=None):
+            _truncate_all_databases()
         
     except Exception as e:
-        _print_error(f"Infrastructure setup failed: {e}")
+        _log_error(f"Infrastructure setup failed: {e}")
         raise SystemExit(1)
 
 
+def pytest_sessionstart(session):
+    """
+    Session gate: every process waits until the microservices are routable before any test runs.
+    The controller already probed in pytest_configure (memoized), so this only does work in xdist workers.
+    """
+    _probe_infrastructure()
+
+
 def pytest_sessionfinish(session, exitstatus):
     """Post-test cleanup hook. Runs AFTER all tests."""
-    _print_header("TEARDOWN: Stopping infrastructure")
-    
-    subprocess.run(
-        ["docker-compose", "-f", COMPOSE_FILE, "down", "-v"],
-        check=False,
-        capture_output=True,
-    )
+    _cleanup_executor.shutdown(wait=True)
+    if _is_xdist_worker():
+        return
+
+    if session.config.getoption("keep_stack"):
+        _log_success("Keeping docker-compose stack running (--keep-stack)")
+        return
+
+    _log_header("TEARDOWN: Stopping infrastructure")
     
-    _print_success("Docker-compose stopped")
-    print()
+    _compose("down", "-v")
+
+    _log_success("Docker-compose stopped")
 
 
 # ============================================================================
@@ -212,78 +478,135 @@ def pg_connection(
         conn.close()
 
 
+def pg_pool(
+    host: str,
+    port: int,
+    db: str,
+    user: str = "itmouser",
+    password: str = "itmopassword"
+) -> ThreadedConnectionPool:
+    """Thread-safe PostgreSQL connection pool."""
+    return ThreadedConnectionPool(
+        minconn=2,
+        maxconn=8,
+        host=host,
+        port=port,
+        dbname=db,
+        user=user,
+        password=password,
+    )
+
+
+@contextmanager
+def pooled_connection(pool: ThreadedConnectionPool):
+    """Borrow a connection from the pool; putconn() rolls back anything left open."""
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
 # ============================================================================
 # SESSION-SCOPED FIXTURES
 # ============================================================================
 
 @pytest.fixture(scope="session")
-def db_user():
+def db_pools() -> Iterator[Dict[str, ThreadedConnectionPool]]:
+    """One connection pool per service database, keyed like DB_CONFIG."""
+    pools = {name: pg_pool(host, port, db) for name, host, port, db in DB_CONFIG}
+    try:
+        yield pools
+    finally:
+        for pool in pools.values():
+            pool.closeall()
+
+
+@pytest.fixture(scope="session")
+def http() -> Iterator[httpx.Client]:
+    """Pooled HTTP client shared by all tests (keep-alive to the gateway, paths relative to it)."""
+    with _http_session() as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def truncate_statements(db_pools) -> Dict[str, Optional[str]]:
+    """
+    Build one multi-table TRUNCATE per database, run with triggers disabled.
+    Existing tables are probed once per session, so missing ones never reach clean_databases.
+    """
+    statements = {}
+    for conn_name, pool in db_pools.items():
+        with pooled_connection(pool) as conn:
+            statements[conn_name] = _truncate_sql(conn)
+    return statements
+
+
+# ============================================================================
+# FUNCTION-SCOPED FIXTURES
+# ============================================================================
+
+@pytest_asyncio.fixture
+async def async_http() -> AsyncIterator[httpx.AsyncClient]:
+    """Async HTTP client for tests that overlap independent requests with asyncio.gather."""
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        socket_options=_SOCKET_OPTIONS,
+    )
+    async with _OrjsonAsyncClient(**_HTTP_CLIENT_OPTIONS, transport=transport) as client:
+        yield client
+
+
+@pytest.fixture
+def db_user(db_pools):
     """User Service Database (postgres-user:5401)"""
-    with pg_connection("localhost", 5401, "itmomarket_user") as conn:
+    with pooled_connection(db_pools["db_user"]) as conn:
         yield conn
 
 
-@pytest.fixture(scope="session")
-def db_product():
+@pytest.fixture
+def db_product(db_pools):
     """Product Service Database (postgres-product:5402)"""
-    with pg_connection("localhost", 5402, "itmomarket_product") as conn:
+    with pooled_connection(db_pools["db_product"]) as conn:
         yield conn
 
 
-@pytest.fixture(scope="session")
-def db_order():
+@pytest.fixture
+def db_order(db_pools):
     """Order Service Database (postgres-order:5403)"""
-    with pg_connection("localhost", 5403, "itmomarket_order") as conn:
+    with pooled_connection(db_pools["db_order"]) as conn:
         yield conn
 
 
-@pytest.fixture(scope="session")
-def db_moderation():
+@pytest.fixture
+def db_moderation(db_pools):
     """Moderation Service Database (postgres-moderation:5404)"""
-    with pg_connection("localhost", 5404, "itmomarket_moderation") as conn:
+    with pooled_connection(db_pools["db_moderation"]) as conn:
         yield conn
 
 
-# ============================================================================
-# FUNCTION-SCOPED FIXTURES
-# ============================================================================
-
-
 @pytest.fixture(autouse=True)
-def clean_databases(db_user, db_product, db_order, db_moderation):
+def clean_databases(request, worker_id, db_user, db_product, db_order, db_moderation, truncate_statements):
     """
-    Очищает все БД перед каждым тестом.
-    ВАЖНО: порядок TRUNCATE подогнать под реальные имена таблиц и FK.
+    Очищает все БД перед тестами с маркером dirty_db.
+    Остальные тесты работают на уникальных данных и очистки не требуют.
+    Одна команда TRUNCATE и один commit на каждую БД, все БД параллельно.
+    Под xdist воркеры делят одни БД: TRUNCATE в одном воркере стёр бы данные
+    тестов в других, поэтому БД очищаются один раз контроллером (pytest_configure).
     """
-    # Порядок: сначала таблицы без FK, потом с FK
-    truncate_queries = [
-        "TRUNCATE TABLE order_items CASCADE;",
-        "TRUNCATE TABLE orders CASCADE;",
-        "TRUNCATE TABLE carts CASCADE;",
-        "TRUNCATE TABLE moderation_audit CASCADE;",  # ← FIX: moderation_audit (не audits)
-        "TRUNCATE TABLE moderation_actions CASCADE;",
-        "TRUNCATE TABLE products CASCADE;",
-        "TRUNCATE TABLE shops CASCADE;",
-        "TRUNCATE TABLE user_roles CASCADE;",  # ← FIX: добавили user_roles
-        "TRUNCATE TABLE users CASCADE;",
+    if worker_id != "master" or "dirty_db" not in request.node.keywords:
+        yield
+        return
+
+    futures = [
+        _cleanup_executor.submit(_truncate, conn, truncate_statements[conn_name])
+        for conn_name, conn in [("db_order", db_order), ("db_moderation", db_moderation),
+                                ("db_product", db_product), ("db_user", db_user)]
+        if truncate_statements[conn_name] is not None
     ]
+    wait(futures)
+    for future in futures:
+        future.result()
 
-    for conn_name, conn in [("db_order", db_order), ("db_moderation", db_moderation), 
-                             ("db_product", db_product), ("db_user", db_user)]:
-        try:
-            with conn.cursor() as cur:
-                for q in truncate_queries:
-                    try:
-                        cur.execute(q)
-                        conn.commit()  # ← FIX: коммит каждого TRUNCATE отдельно
-                    except psycopg2.errors.UndefinedTable:
-                        # Таблица не существует в этой БД — пропускаем
-                        conn.rollback()
-                    except Exception as e:
-                        # Другие ошибки логируем и откатываем
-                        conn.rollback()
-                        print(f"Warning in {conn_name}: {e}")
-        except Exception as e:
-            print(f"Error cleaning {conn_name}: {e}")
-
-    yield
\ No newline at end of file
+    yield
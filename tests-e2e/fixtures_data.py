@@ -1,79 +1,122 @@
 # fixtures_data.py
-from typing import List
-import uuid
+from typing import Dict, List, Tuple
+import itertools
+import os
+import random
 
+import orjson
 import psycopg2
 import pytest
 import time
+from psycopg2.extras import execute_values
+
+# Адрес API Gateway; контроллер xdist публикует его воркерам через окружение
+GATEWAY_URL = os.environ.get("E2E_GATEWAY_URL", "http://localhost:8080")
+
+# Суффиксы уникальных имён: счётчик от времени старта в мс (запуски на
+# переиспользуемом стеке не пересекаются) плюс id воркера xdist
+_ids = itertools.count(int(time.time() * 1000))
+_WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+
+
+def response_json(resp):
+    """Тело ответа httpx, разобранное orjson — быстрее, чем resp.json()."""
+    return orjson.loads(resp.content)
+
+
+def unique_suffix() -> str:
+    """Короткий уникальный суффикс для имён тестовых строк (влезает в username VARCHAR(32))."""
+    return f"{_WORKER_ID}{next(_ids):x}"
 
 
 # ---------- низкоуровневые функции вставки ----------
+# `with conn` коммитит транзакцию при успехе и откатывает при исключении.
 
 
-def create_user(conn: psycopg2.extensions.connection,
-                username: str,
-                email: str,
-                roles: List[str]) -> int:
+def bulk_create_users(conn: psycopg2.extensions.connection,
+                      rows: List[Tuple[str, str, List[str]]]) -> List[int]:
     """
-    Создаёт пользователя в БД user-service и его роли.
-    Подстрой имена таблиц/колонок под свою схему.
+    Создаёт пачку пользователей (username, email, roles) и их роли.
+    Два INSERT ... VALUES на всю пачку вместо двух на каждого пользователя.
     """
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
+    with conn, conn.cursor() as cur:
+        user_ids = [
+            row[0] for row in execute_values(
+                cur,
                 """
                 INSERT INTO users (username, email, password, first_name, last_name, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, NOW(), NOW())
+                VALUES %s
                 RETURNING id;
                 """,
-                (username, email, "$2a$10$e2ehashedpassword", "Test", "User"),
+                [(username, email, "$2a$10$e2ehashedpassword", "Test", "User")
+                 for username, email, _ in rows],
+                template="(%s, %s, %s, %s, %s, NOW(), NOW())",
+                fetch=True,
             )
-            user_id = cur.fetchone()[0]
-
-            # если есть таблица user_roles
-            for role in roles:
-                try:
-                    cur.execute(
-                        """
-                        INSERT INTO user_roles (user_id, role)
-                        VALUES (%s, %s);
-                        """,
-                        (user_id, role),
-                    )
-                except psycopg2.errors.UndefinedTable:
-                    # Таблица не существует, просто пропускаем
-                    conn.rollback()
-                    break
-
-        conn.commit()
-        return user_id
-    except Exception as e:
-        conn.rollback()  # ← Откати транзакцию при ошибке
-        raise
+        ]
 
+        user_roles = [
+            (user_id, role)
+            for user_id, (_, _, roles) in zip(user_ids, rows)
+            for role in roles
+        ]
+        if user_roles:
+            execute_values(
+                cur,
+                "INSERT INTO user_roles (user_id, role) VALUES %s;",
+                user_roles,
+            )
+    return user_ids
 
-def create_shop(conn: psycopg2.extensions.connection,
-                name: str,
-                seller_id: int) -> int:
+
+def bulk_create_products(conn: psycopg2.extensions.connection,
+                         rows: List[Tuple[str, int, int, str]]) -> List[int]:
     """
-    Создаёт магазин в БД product-service.
+    Создаёт пачку товаров (name, shop_id, seller_id, status) одним INSERT.
     """
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
+    with conn, conn.cursor() as cur:
+        return [
+            row[0] for row in execute_values(
+                cur,
                 """
-                INSERT INTO shops (name, description, avatar_url, seller_id, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, NOW(), NOW())
+                INSERT INTO products (name, description, price, image_url, shop_id, seller_id, status, created_at, updated_at)
+                VALUES %s
                 RETURNING id;
                 """,
-                (name, "Test shop", None, seller_id),
+                [(name, "Test product", 100.00, None, shop_id, seller_id, status)
+                 for name, shop_id, seller_id, status in rows],
+                template="(%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())",
+                fetch=True,
             )
-            shop_id = cur.fetchone()[0]
-        conn.commit()
-        return shop_id
-    except Exception as e:
-        conn.rollback()
-        raise
+        ]
+
+
+def create_user(conn: psycopg2.extensions.connection,
+                username: str,
+                email: str,
+                roles: List[str]) -> int:
+    """
+    Создаёт пользователя в БД user-service и его роли.
+    """
+    return bulk_create_users(conn, [(username, email, roles)])[0]
+
+
+def create_shop(conn: psycopg2.extensions.connection,
+                name: str,
+                seller_id: int) -> int:
+    """
+    Создаёт магазин в БД product-service.
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO shops (name, description, avatar_url, seller_id, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, NOW(), NOW())
+            RETURNING id;
+            """,
+            (name, "Test shop", None, seller_id),
+        )
+        return cur.fetchone()[0]
 
 
 def create_product(conn: psycopg2.extensions.connection,
@@ -84,31 +127,105 @@ def create_product(conn: psycopg2.extensions.connection,
     """
     Создаёт товар в БД product-service.
     """
-    try:
-        with conn.cursor() as cur:
+    return bulk_create_products(conn, [(name, shop_id, seller_id, status)])[0]
+
+
+# ---------- переиспользуемые между тестами строки ----------
+
+
+def reuse_user(conn: psycopg2.extensions.connection,
+               cache: Dict[str, Tuple[int, str]],
+               role: str) -> int:
+    """
+    Возвращает закэшированного пользователя с ролью role.
+    Если его стёр TRUNCATE (dirty_db), создаёт заново. Проверяем id вместе
+    с username: после RESTART IDENTITY тот же id может достаться другому.
+    """
+    cached = cache.get(role)
+    if cached is not None:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM users WHERE id = %s AND username = %s;", cached)
+            if cur.fetchone() is not None:
+                return cached[0]
+
+    unique_id = unique_suffix()
+    username = f"e2e_{role.lower()}_{unique_id}"
+    user_id = create_user(conn, username, f"{username}@example.com", [role])
+    cache[role] = (user_id, username)
+    return user_id
+
+
+def reuse_shop(conn: psycopg2.extensions.connection,
+               cache: Dict[str, Tuple[int, str, int]],
+               seller_id: int) -> int:
+    """
+    Возвращает закэшированный магазин продавца seller_id, пересоздавая его,
+    если магазин стёр TRUNCATE или продавец сменился.
+    """
+    cached = cache.get("shop")
+    if cached is not None and cached[2] == seller_id:
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM shops WHERE id = %s AND name = %s AND seller_id = %s;", cached)
+            if cur.fetchone() is not None:
+                return cached[0]
+
+    name = f"E2E Shop {unique_suffix()}"
+    shop_id = create_shop(conn, name, seller_id)
+    cache["shop"] = (shop_id, name, seller_id)
+    return shop_id
+
+
+def reuse_approved_product(conn: psycopg2.extensions.connection,
+                           cache: Dict[str, Tuple[int, str, int, int]],
+                           shop_id: int,
+                           seller_id: int) -> int:
+    """
+    Возвращает закэшированный одобренный товар для пары (shop_id, seller_id),
+    пересоздавая его, если товар стёр TRUNCATE или сменился магазин/продавец.
+    """
+    cached = cache.get("product_approved")
+    if cached is not None and cached[2:] == (shop_id, seller_id):
+        with conn, conn.cursor() as cur:
             cur.execute(
-                """
-                INSERT INTO products (name, description, price, image_url, shop_id, seller_id, status, created_at, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
-                RETURNING id;
-                """,
-                (name, "Test product", 100.00, None, shop_id, seller_id, status),
+                "SELECT 1 FROM products"
+                " WHERE id = %s AND name = %s AND shop_id = %s AND seller_id = %s AND status = 'APPROVED';",
+                cached,
             )
-            product_id = cur.fetchone()[0]
-        conn.commit()
-        return product_id
-    except Exception as e:
-        conn.rollback()
-        raise
+            if cur.fetchone() is not None:
+                return cached[0]
+
+    name = f"Approved Product {unique_suffix()}"
+    product_id = create_product(conn, name, shop_id, seller_id, "APPROVED")
+    cache["product_approved"] = (product_id, name, shop_id, seller_id)
+    return product_id
 
 
 # ---------- pytest fixtures ----------
 
 
+@pytest.fixture(scope="session")
+def _session_rows() -> Dict[str, tuple]:
+    """
+    Кэш строк, общих для всех тестов сессии: пользователи по роли, магазин
+    и одобренный товар.
+    Каждый воркер xdist — отдельный процесс со своим кэшем.
+    """
+    return {}
+
+
+@pytest.fixture
+def user(db_user, _session_rows) -> int:
+    """Пользователь с ролью USER для тестов, которые его только читают (один на сессию)."""
+    return reuse_user(db_user, _session_rows, "USER")
+
+
 @pytest.fixture
-def user(db_user) -> int:
-    """Обычный пользователь с ролью USER."""
-    unique_id = str(uuid.uuid4())[:8]
+def ephemeral_user(db_user) -> int:
+    """
+    Свежий пользователь с ролью USER для тестов, которые меняют его
+    самого, его корзину или заказы.
+    """
+    unique_id = unique_suffix()
     return create_user(
         db_user,
         f"e2e_user_{unique_id}",
@@ -118,9 +235,18 @@ def user(db_user) -> int:
 
 
 @pytest.fixture
-def seller(db_user) -> int:
-    """Продавец с ролью SELLER."""
-    unique_id = str(uuid.uuid4())[:8]
+def seller(db_user, _session_rows) -> int:
+    """Продавец с ролью SELLER (один на сессию, тестам нужен лишь «какой-то продавец»)."""
+    return reuse_user(db_user, _session_rows, "SELLER")
+
+
+@pytest.fixture
+def ephemeral_seller(db_user) -> int:
+    """
+    Свежий продавец без магазина — для тестов, которые создают магазин сами
+    (у продавца может быть только один магазин, а `seller` общий на сессию).
+    """
+    unique_id = unique_suffix()
     return create_user(
         db_user,
         f"e2e_seller_{unique_id}",
@@ -130,32 +256,21 @@ def seller(db_user) -> int:
 
 
 @pytest.fixture
-def moderator(db_user) -> int:
-    """Модератор с ролью MODERATOR."""
-    unique_id = str(uuid.uuid4())[:8]
-    return create_user(
-        db_user,
-        f"e2e_moderator_{unique_id}",
-        f"e2e_moderator_{unique_id}@example.com",
-        ["MODERATOR"]
-    )
+def moderator(db_user, _session_rows) -> int:
+    """Модератор с ролью MODERATOR (один на сессию)."""
+    return reuse_user(db_user, _session_rows, "MODERATOR")
 
 
 @pytest.fixture
-def shop(db_product, seller) -> int:
-    """Магазин для продавца."""
-    unique_id = str(uuid.uuid4())[:8]
-    return create_shop(
-        db_product,
-        f"E2E Shop {unique_id}",
-        seller
-    )
+def shop(db_product, seller, _session_rows) -> int:
+    """Магазин продавца (один на сессию: у продавца может быть только один магазин)."""
+    return reuse_shop(db_product, _session_rows, seller)
 
 
 @pytest.fixture
 def product_pending(db_product, seller, shop) -> int:
-    """Товар в статусе PENDING (для модерации)."""
-    unique_id = str(uuid.uuid4())[:8]
+    """Товар в статусе PENDING (для модерации); свой на каждый тест — модерация меняет его статус."""
+    unique_id = unique_suffix()
     return create_product(
         db_product,
         f"Pending Product {unique_id}",
@@ -166,30 +281,33 @@ def product_pending(db_product, seller, shop) -> int:
 
 
 @pytest.fixture
-def product_approved(db_product, seller, shop) -> int:
-    """Товар в статусе APPROVED (для каталога и корзины)."""
-    unique_id = str(uuid.uuid4())[:8]
-    return create_product(
-        db_product,
-        f"Approved Product {unique_id}",
-        shop,
-        seller,
-        "APPROVED"
-    )
+def product_approved(db_product, seller, shop, _session_rows) -> int:
+    """
+    Товар в статусе APPROVED (для каталога и корзины). Тесты его только читают,
+    поэтому он один на сессию для пары (shop, seller).
+    """
+    return reuse_approved_product(db_product, _session_rows, shop, seller)
 
 
 @pytest.fixture
 def wait_until():
-    """Fixture для ожидания условия"""
-    def _wait_until(condition, timeout_seconds=30, check_interval=0.5):
-        start_time = time.time()
-        while time.time() - start_time < timeout_seconds:
+    """
+    Fixture для ожидания условия.
+    Интервал между проверками растёт экспоненциально (с небольшим джиттером)
+    от initial_interval до max_interval: быстрые условия ловятся за десятки
+    миллисекунд, а долгие не засыпают сервис запросами.
+    """
+    def _wait_until(condition, timeout_seconds=30, initial_interval=0.025, max_interval=0.5):
+        deadline = time.monotonic() + timeout_seconds
+        delay = initial_interval
+        while time.monotonic() < deadline:
             try:
                 if condition():
                     return True
             except:
                 pass
-            time.sleep(check_interval)
+            time.sleep(min(delay + random.uniform(0, delay / 2), max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, max_interval)
         return False
     return _wait_until
 
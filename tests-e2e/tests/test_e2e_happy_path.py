@@ -1,24 +1,16 @@
 # tests/test_e2e_happy_path.py
-import requests
-import pytest
+import asyncio
 
-from fixtures_data import user, seller, shop
+import pytest
 
-BASE = "http://localhost:8080"
+from fixtures_data import ephemeral_user, seller, shop, response_json
 
 
 @pytest.mark.smoke
-def test_full_shopping_flow(user, seller, moderator, shop, wait_until):
-
-    success = wait_until(
-        lambda: requests.get(f"{BASE}/moderation-service/actuator/health/readiness").status_code != 503,
-        timeout_seconds=10
-    )
-    assert success, "Moderation service is not available"
-    
+async def test_full_shopping_flow(async_http, ephemeral_user, seller, moderator, shop):
     # 1. Создаём товар
-    create_resp = requests.post(
-        f"{BASE}/product-service/api/products",
+    create_resp = await async_http.post(
+        "/product-service/api/products",
         params={"sellerId": seller},
         json={
             "name": "Flow Product",
@@ -29,30 +21,31 @@ def test_full_shopping_flow(user, seller, moderator, shop, wait_until):
         },
     )
     assert create_resp.status_code == 201
-    product_id = create_resp.json()["id"]
-
-    # 2. Модератор одобряет
-    approve_resp = requests.post(
-        f"{BASE}/moderation-service/api/moderation/products/{product_id}/approve",
-        params={"moderatorId": moderator},
-    )
-    assert approve_resp.status_code == 200, approve_resp.json()
-
-    # 3. Пользователь добавляет в корзину
-    add_resp = requests.post(
-        f"{BASE}/order-service/api/cart/items",
-        params={"userId": user},
-        json={"productId": product_id, "quantity": 2},
+    product_id = response_json(create_resp)["id"]
+
+    # 2-3. Модератор одобряет, пользователь добавляет в корзину — независимо друг от друга
+    # (корзина проверяет только существование товара, не его статус)
+    approve_resp, add_resp = await asyncio.gather(
+        async_http.post(
+            f"/moderation-service/api/moderation/products/{product_id}/approve",
+            params={"moderatorId": moderator},
+        ),
+        async_http.post(
+            "/order-service/api/cart/items",
+            params={"userId": ephemeral_user},
+            json={"productId": product_id, "quantity": 2},
+        ),
     )
+    assert approve_resp.status_code == 200, response_json(approve_resp)
     assert add_resp.status_code == 200
 
     # 4. Создаём заказ
-    order_resp = requests.post(
-        f"{BASE}/order-service/api/orders",
-        params={"userId": user},
+    order_resp = await async_http.post(
+        "/order-service/api/orders",
+        params={"userId": ephemeral_user},
         json={"deliveryAddress": "SPb, Nevsky 1"},
     )
     assert order_resp.status_code == 201
-    order = order_resp.json()
-    assert order["userId"] == user
+    order = response_json(order_resp)
+    assert order["userId"] == ephemeral_user
     assert len(order["items"]) == 1
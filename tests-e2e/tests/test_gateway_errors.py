@@ -1,27 +1,17 @@
 # tests/test_gateway_errors.py
-import requests
 import pytest
 
 
-BASE = "http://localhost:8080"
-
-
-@pytest.mark.error_handling
-def test_not_found_endpoint():
-    resp = requests.get(f"{BASE}/non-existent-path")
-    assert resp.status_code in (404, 500)
-
-
-@pytest.mark.error_handling
-def test_invalid_product_id():
-    resp = requests.get(f"{BASE}/product-service/api/products/-1")
-    assert resp.status_code in (400, 404)
-
-
 @pytest.mark.error_handling
-def test_invalid_cart_user_id():
-    resp = requests.get(
-        f"{BASE}/order-service/api/cart",
-        params={"userId": -1},
-    )
-    assert resp.status_code in (400, 404)
+@pytest.mark.parametrize(
+    "path, params, expected_codes",
+    [
+        ("/non-existent-path", None, (404, 500)),
+        ("/product-service/api/products/-1", None, (400, 404)),
+        ("/order-service/api/cart", {"userId": -1}, (400, 404)),
+    ],
+    ids=["not_found_endpoint", "invalid_product_id", "invalid_cart_user_id"],
+)
+def test_gateway_error(http, path, params, expected_codes):
+    resp = http.get(path, params=params)
+    assert resp.status_code in expected_codes
@@ -1,75 +1,74 @@
 # tests/test_moderation_service.py
-import requests
 import pytest
 
-from fixtures_data import moderator, product_pending, seller, shop, create_product
+from fixtures_data import moderator, product_pending, seller, shop, bulk_create_products, response_json
 
-BASE = "http://localhost:8080/moderation-service/api/moderation"
+BASE = "/moderation-service/api/moderation"
+APPROVE_URL = (BASE + "/products/{}/approve").format
 
 
 @pytest.mark.regression
 class TestModerationService:
 
-    def test_get_pending_products(self, moderator, product_pending):
-        resp = requests.get(
+    def test_get_pending_products(self, http, moderator, product_pending):
+        resp = http.get(
             f"{BASE}/products",
             params={"moderatorId": moderator, "page": 1, "pageSize": 20},
         )
         assert resp.status_code == 200
 
-    def test_get_pending_product_by_id(self, moderator, product_pending):
-        resp = requests.get(
+    def test_get_pending_product_by_id(self, http, moderator, product_pending):
+        resp = http.get(
             f"{BASE}/products/{product_pending}",
             params={"moderatorId": moderator},
         )
         assert resp.status_code == 200
-        assert resp.json()["id"] == product_pending
+        assert response_json(resp)["id"] == product_pending
 
-    def test_approve_product(self, moderator, product_pending):
-        resp = requests.post(
-            f"{BASE}/products/{product_pending}/approve",
+    def test_approve_product(self, http, moderator, product_pending):
+        resp = http.post(
+            APPROVE_URL(product_pending),
             params={"moderatorId": moderator},
         )
         assert resp.status_code == 200
-        result = resp.json()
+        result = response_json(resp)
         assert result["productId"] == product_pending
         assert result["newStatus"] == "APPROVED"
 
-    def test_reject_product(self, moderator, product_pending):
+    def test_reject_product(self, http, moderator, product_pending):
         payload = {"reason": "Invalid description"}
-        resp = requests.post(
+        resp = http.post(
             f"{BASE}/products/{product_pending}/reject",
             params={"moderatorId": moderator},
             json=payload,
         )
         assert resp.status_code == 200
-        result = resp.json()
+        result = response_json(resp)
         assert result["newStatus"] == "REJECTED"
         assert result["reason"] == "Invalid description"
 
-    def test_bulk_moderate(self, moderator, db_product, seller, shop):
-        ids = [
-            create_product(db_product, f"Bulk {i}", shop, seller, "PENDING")
-            for i in range(3)
-        ]
+    def test_bulk_moderate(self, http, moderator, db_product, seller, shop):
+        ids = bulk_create_products(
+            db_product, [(f"Bulk {i}", shop, seller, "PENDING") for i in range(3)]
+        )
         payload = {"productIds": ids, "action": "APPROVE"}
-        resp = requests.post(
+        resp = http.post(
             f"{BASE}/bulk",
             params={"moderatorId": moderator},
             json=payload,
         )
         assert resp.status_code == 200
-        results = resp.json()
+        results = response_json(resp)
         assert len(results) == 3
         assert all(r["newStatus"] == "APPROVED" for r in results)
 
-    def test_moderation_history_by_moderator(self, moderator):
-        resp = requests.get(
+    def test_moderation_history_by_moderator(self, http, moderator):
+        resp = http.get(
             f"{BASE}/history",
             params={"moderatorId": moderator},
         )
         assert resp.status_code == 200
 
-    def test_product_moderation_history(self, product_pending):
-        resp = requests.get(f"{BASE}/products/{product_pending}/history")
+    def test_product_moderation_history(self, http, product_pending):
+        resp = http.get(f"{BASE}/products/{product_pending}/history")
         assert resp.status_code == 200
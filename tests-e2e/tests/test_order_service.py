@@ -1,106 +1,107 @@
 # tests/test_order_service.py
-import requests
+import asyncio
+
 import pytest
 
-from fixtures_data import user, product_approved
+from fixtures_data import ephemeral_user, product_approved, response_json
 
-BASE = "http://localhost:8080/order-service/api"
+BASE = "/order-service/api"
 
 
 @pytest.mark.regression
 class TestOrderService:
 
-    def test_get_empty_cart(self, user):
-        resp = requests.get(f"{BASE}/cart", params={"userId": user})
+    def test_get_empty_cart(self, http, ephemeral_user):
+        resp = http.get(f"{BASE}/cart", params={"userId": ephemeral_user})
         assert resp.status_code == 200
-        assert resp.json()["items"] == []
+        assert response_json(resp)["items"] == []
 
-    def test_add_to_cart_and_get(self, user, product_approved):
+    def test_add_to_cart_and_get(self, http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 2}
-        resp = requests.post(
+        resp = http.post(
             f"{BASE}/cart/items",
-            params={"userId": user},
+            params={"userId": ephemeral_user},
             json=payload,
         )
         assert resp.status_code == 200
-        cart = resp.json()
+        cart = response_json(resp)
         assert len(cart["items"]) == 1
 
-        resp2 = requests.get(f"{BASE}/cart", params={"userId": user})
+        resp2 = http.get(f"{BASE}/cart", params={"userId": ephemeral_user})
         assert resp2.status_code == 200
-        assert len(resp2.json()["items"]) == 1
+        assert len(response_json(resp2)["items"]) == 1
 
-    def test_update_cart_item(self, user, product_approved):
+    def test_update_cart_item(self, http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 1}
-        requests.post(f"{BASE}/cart/items", params={"userId": user}, json=payload)
-        cart = requests.get(f"{BASE}/cart", params={"userId": user}).json()
+        # POST возвращает всю корзину — id позиции берём прямо из ответа
+        cart = response_json(http.post(f"{BASE}/cart/items", params={"userId": ephemeral_user}, json=payload))
         item_id = cart["items"][0]["id"]
 
         update_payload = {"quantity": 5}
-        resp = requests.put(
+        resp = http.put(
             f"{BASE}/cart/items/{item_id}",
-            params={"userId": user},
+            params={"userId": ephemeral_user},
             json=update_payload,
         )
         assert resp.status_code == 200
-        new_cart = resp.json()
+        new_cart = response_json(resp)
         assert new_cart["items"][0]["quantity"] == 5
 
-    def test_remove_from_cart(self, user, product_approved):
+    def test_remove_from_cart(self, http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 1}
-        requests.post(f"{BASE}/cart/items", params={"userId": user}, json=payload)
-        cart = requests.get(f"{BASE}/cart", params={"userId": user}).json()
+        # POST возвращает всю корзину — id позиции берём прямо из ответа
+        cart = response_json(http.post(f"{BASE}/cart/items", params={"userId": ephemeral_user}, json=payload))
         item_id = cart["items"][0]["id"]
 
-        resp = requests.delete(
+        resp = http.delete(
             f"{BASE}/cart/items/{item_id}",
-            params={"userId": user},
+            params={"userId": ephemeral_user},
         )
         assert resp.status_code == 200
-        assert requests.get(f"{BASE}/cart", params={"userId": user}).json()["items"] == []
+        assert response_json(http.get(f"{BASE}/cart", params={"userId": ephemeral_user}))["items"] == []
 
-    def test_clear_cart(self, user, product_approved):
+    def test_clear_cart(self, http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 2}
-        requests.post(f"{BASE}/cart/items", params={"userId": user}, json=payload)
+        http.post(f"{BASE}/cart/items", params={"userId": ephemeral_user}, json=payload)
 
-        resp = requests.delete(f"{BASE}/cart", params={"userId": user})
+        resp = http.delete(f"{BASE}/cart", params={"userId": ephemeral_user})
         assert resp.status_code == 204
-        assert requests.get(f"{BASE}/cart", params={"userId": user}).json()["items"] == []
+        assert response_json(http.get(f"{BASE}/cart", params={"userId": ephemeral_user}))["items"] == []
 
-    def test_create_order_from_cart(self, user, product_approved):
+    def test_create_order_from_cart(self, http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 2}
-        requests.post(f"{BASE}/cart/items", params={"userId": user}, json=payload)
+        http.post(f"{BASE}/cart/items", params={"userId": ephemeral_user}, json=payload)
 
         order_payload = {"deliveryAddress": "SPb, Nevsky 1"}
-        resp = requests.post(
+        resp = http.post(
             f"{BASE}/orders",
-            params={"userId": user},
+            params={"userId": ephemeral_user},
             json=order_payload,
         )
         assert resp.status_code == 201
-        order = resp.json()
-        assert order["userId"] == user
+        order = response_json(resp)
+        assert order["userId"] == ephemeral_user
         assert len(order["items"]) == 1
 
-    def test_get_user_orders_and_order_by_id(self, user, product_approved):
+    async def test_get_user_orders_and_order_by_id(self, async_http, ephemeral_user, product_approved):
         payload = {"productId": product_approved, "quantity": 1}
-        requests.post(f"{BASE}/cart/items", params={"userId": user}, json=payload)
-        order_resp = requests.post(
+        await async_http.post(f"{BASE}/cart/items", params={"userId": ephemeral_user}, json=payload)
+        order_resp = await async_http.post(
             f"{BASE}/orders",
-            params={"userId": user},
+            params={"userId": ephemeral_user},
             json={"deliveryAddress": "Test"},
         )
-        order_id = order_resp.json()["id"]
+        order_id = response_json(order_resp)["id"]
 
-        list_resp = requests.get(
-            f"{BASE}/orders", params={"userId": user, "page": 1, "pageSize": 20}
+        # Список и заказ по id не зависят друг от друга — запрашиваем одновременно
+        list_resp, by_id = await asyncio.gather(
+            async_http.get(f"{BASE}/orders", params={"userId": ephemeral_user, "page": 1, "pageSize": 1}),
+            async_http.get(f"{BASE}/orders/{order_id}", params={"userId": ephemeral_user}),
         )
         assert list_resp.status_code == 200
-        page = list_resp.json()
-        assert any(o["id"] == order_id for o in page["data"])
+        # У свежего пользователя ровно один заказ — первой страницы из одного элемента достаточно
+        page = response_json(list_resp)
+        assert [o["id"] for o in page["data"]] == [order_id]
 
-        by_id = requests.get(
-            f"{BASE}/orders/{order_id}", params={"userId": user}
-        )
         assert by_id.status_code == 200
-        assert by_id.json()["id"] == order_id
+        assert response_json(by_id)["id"] == order_id
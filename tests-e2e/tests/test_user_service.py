@@ -1,16 +1,17 @@
 # tests/test_user_service.py
-import requests
 import pytest
 
-from fixtures_data import user
+from fixtures_data import ephemeral_user, user, response_json, unique_suffix
 
-BASE = "http://localhost:8080/user-service/api/users"
+BASE = "/user-service/api/users"
+USER_URL = (BASE + "/{}").format
 
 
 @pytest.mark.regression
 class TestUserService:
 
-    def test_register_user(self):
+    @pytest.mark.dirty_db
+    def test_register_and_lookup_user(self, http):
         payload = {
             "username": "newuser",
             "email": "new@example.com",
@@ -18,60 +19,47 @@ class TestUserService:
             "firstName": "New",
             "lastName": "User",
         }
-        resp = requests.post(f"{BASE}/register", json=payload)
+        resp = http.post(f"{BASE}/register", json=payload)
         assert resp.status_code == 201
-        data = resp.json()
+        data = response_json(resp)
         assert data["username"] == "newuser"
 
-    def test_get_user_by_id(self, user):
-        resp = requests.get(f"{BASE}/{user}")
+        resp = http.get(f"{BASE}/username/newuser")
         assert resp.status_code == 200
-        data = resp.json()
-        assert data["id"] == user
+        assert response_json(resp)["id"] == data["id"]
 
-    def test_get_user_by_username(self, user):
-        payload = {
-            "username": "newuser",
-            "email": "new@example.com",
-            "password": "Test12345!",
-            "firstName": "New",
-            "lastName": "User",
-        }
-        resp = requests.post(f"{BASE}/register", json=payload)
-        resp = requests.get(f"{BASE}/username/newuser")
+    def test_get_user_by_id(self, http, user):
+        resp = http.get(USER_URL(user))
         assert resp.status_code == 200
-        data = resp.json()
-        assert data["username"] == "newuser"
+        data = response_json(resp)
+        assert data["id"] == user
 
-    def test_get_me(self, user):
-        resp = requests.get(f"{BASE}/me", params={"userId": user})
+    def test_get_me(self, http, user):
+        resp = http.get(f"{BASE}/me", params={"userId": user})
         assert resp.status_code == 200
-        assert resp.json()["id"] == user
+        assert response_json(resp)["id"] == user
 
-    def test_update_profile(self, user):
+    def test_update_profile(self, http, ephemeral_user):
+        # users.email уникален — фиксированный адрес конфликтовал бы со строкой прошлого запуска
+        email = f"updated_{unique_suffix()}@example.com"
         payload = {
-            "email": "updated@example.com",
+            "email": email,
             "firstName": "Updated",
             "lastName": "User",
         }
-        resp = requests.put(f"{BASE}/me", params={"userId": user}, json=payload)
+        resp = http.put(f"{BASE}/me", params={"userId": ephemeral_user}, json=payload)
         assert resp.status_code == 200
-        data = resp.json()
-        assert data["email"] == "updated@example.com"
+        data = response_json(resp)
+        assert data["email"] == email
 
-    def test_delete_user(self, user):
-        resp = requests.delete(f"{BASE}/{user}")
+    def test_delete_user(self, http, ephemeral_user, wait_until):
+        url = USER_URL(ephemeral_user)
+        resp = http.delete(url)
         assert resp.status_code == 204
-        resp2 = requests.get(f"{BASE}/{user}")
-        assert resp2.status_code == 404
 
-    def test_delete_user(self, user, wait_until):  # ← Добавить fixture
-        resp = requests.delete(f"{BASE}/{user}")
-        assert resp.status_code == 204
-        
         # Ждем 404 (максимум 10 секунд)
         success = wait_until(
-            lambda: requests.get(f"{BASE}/{user}").status_code == 404,
+            lambda: http.get(url).status_code == 404,
             timeout_seconds=10
         )
         assert success, "User should be deleted"